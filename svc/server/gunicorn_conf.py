@@ -0,0 +1,16 @@
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8081")
+
+# Every worker runs the lifespan event, so it opens its own pool of
+# DATABASE_POOL_SIZE connections and executes the (idempotent) init script.
+workers = int(os.environ.get("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+
+# Inherited by the workers: the default pool size is divided between them, and
+# each one logs to its own file, as several processes can not rotate one file.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+os.environ["LOGFILE_PER_PROCESS"] = "1"
+
+worker_class = "uvicorn_worker.UvicornWorker"
+
+keepalive = 5
@@ -1,3 +1,6 @@
+-- Executed on startup when PRAGMA user_version is behind _SCHEMA_VERSION in
+-- main.py. Workers starting at the same time may all execute it, so it must
+-- stay idempotent.
 CREATE TABLE IF NOT EXISTS products (
     product_id INTEGER PRIMARY KEY AUTOINCREMENT,
     product_name VARCHAR(255) NOT NULL UNIQUE,
@@ -8,6 +11,35 @@ CREATE TABLE IF NOT EXISTS products (
 );
 
 
+-- Bumped by every change of products, used as ETag of the product list.
+CREATE TABLE IF NOT EXISTS products_version (
+    version INTEGER NOT NULL
+);
+
+INSERT INTO products_version (version)
+    SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM products_version);
+
+CREATE TRIGGER IF NOT EXISTS products_version_on_insert AFTER INSERT ON products
+BEGIN
+    UPDATE products_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_version_on_update AFTER UPDATE ON products
+BEGIN
+    UPDATE products_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_version_on_delete AFTER DELETE ON products
+BEGIN
+    UPDATE products_version SET version = version + 1;
+END;
+
+
+-- Products offered by the recommender, see select_active_nonzero_products.
+CREATE INDEX IF NOT EXISTS idx_active_instock ON products (active, quantity)
+    WHERE active = 1 AND quantity > 0;
+
+
 INSERT OR IGNORE INTO products (product_name, product_description, quantity, price, active) VALUES
     ("Cat Indoor Basic", "For adult indoor cats with medium activity", 20, 150, true),
     ("Exotic Pet Blend", "For cats with sensitive digestion", 10, 230, false),
@@ -16,3 +48,9 @@ INSERT OR IGNORE INTO products (product_name, product_description, quantity, pri
     ("Premium Dog Active", "For large active dogs", 12, 300, true),
     ("Small Breed Mix", "For small breed dogs", 18, 180, true),
     ("Cat Sensitive Care", "For small exotic pets", 5, 400, true);
+
+
+-- Version 2 of this script ran ANALYZE right after the seed, and the planner
+-- kept using statistics of 7 rows however large the table grew. Statistics are
+-- maintained by PRAGMA optimize in ConnectionPool instead.
+DROP TABLE IF EXISTS sqlite_stat1;
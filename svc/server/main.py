@@ -1,9 +1,12 @@
+import asyncio
 import logging
 import os
+import time
 from contextlib import asynccontextmanager
 from typing import Annotated, AsyncGenerator, Optional
 
 import aiosqlite
+import orjson
 from dotenv import load_dotenv
 from fastapi import (
     Depends,
@@ -15,12 +18,18 @@ from fastapi import (
     Response,
     status,
 )
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from google.genai.errors import APIError
+from src.data.database import ConnectionPool, default_pool_size
 from src.data.exceptions import PetStoreException
+from src.data.loader import ProductLoader
 from src.data.models import (
+    ApiStatus,
     DefaultErrorModel,
+    NotFound,
     Product,
+    ProductIdBatch,
     ProductUpdate,
     ProductWithId,
     ProductWithIdList,
@@ -31,26 +40,42 @@ from src.data.models import (
 from src.data.queries import (
     deactivate_product,
     insert_product,
-    select_product,
-    select_products,
+    iter_product_batches,
+    select_products_by_ids,
+    select_products_version,
     sell_product,
     update_product,
 )
 from src.llm.geminillm import GeminiRecommender
 from src.logger import start_logging, stop_logging
+from src.singleflight import SharedStream
 
 load_dotenv()
 
+with open(os.environ.get("DATABASE_INIT_SCRIPT_PATH", "init_sql.sql")) as f:
+
+    _INIT_SQL = f.read()
+
+# Must be bumped on every change of the init script, so existing databases
+# execute it again.
+_SCHEMA_VERSION = 3
 
 logger = logging.getLogger(__name__)
 
 
+# Seconds during which the status probe reuses the last database check.
+_STATUS_CHECK_INTERVAL = 5
+
+# Seconds after which the database is reported as not reachable.
+_STATUS_CHECK_TIMEOUT = 1
+
+
 @asynccontextmanager
 async def lifespan_event(app: FastAPI) -> AsyncGenerator[None, None]:
     """Generate lifespan event on demand of API.
 
-    Instantiates database connection object, and puts into the state of the
-    application.
+    Instantiates a pool of database connections, and puts it into the state of
+    the application.
 
     Parameters
     ----------
@@ -64,25 +89,42 @@ async def lifespan_event(app: FastAPI) -> AsyncGenerator[None, None]:
     """
     start_logging()
 
-    app.state.database = await aiosqlite.connect(
-        os.environ.get("DATABASE_PATH", "default.sqlite")
+    app.state.pool = ConnectionPool(
+        os.environ.get("DATABASE_PATH", "default.sqlite"), size=default_pool_size()
     )
 
-    app.state.gemini_recommender = GeminiRecommender(
-        api_key=os.environ.get("GEMINI_API_KEY"), connection=app.state.database
+    await app.state.pool.open()
+
+    app.state.product_loader = ProductLoader(app.state.pool)
+
+    app.state.products_streams = {}
+
+    app.state.database_check = None
+    app.state.last_db_check = float("-inf")
+
+    # Building the Gemini client is blocking (~100ms), keep it off the event loop.
+    app.state.gemini_recommender = await asyncio.to_thread(
+        GeminiRecommender, api_key=os.environ.get("GEMINI_API_KEY"), pool=app.state.pool
     )
 
-    async with app.state.database.cursor() as cursor:
+    async with app.state.pool.acquire_writer() as connection:
 
-        with open(os.environ.get("DATABASE_INIT_SCRIPT_PATH", "init_sql.sql")) as f:
+        async with connection.execute("PRAGMA user_version;") as cursor:
 
-            initial_script = f.read()
+            (schema_version,) = await cursor.fetchone()
 
-        await cursor.executescript(initial_script)
+        if schema_version < _SCHEMA_VERSION:
 
-    await app.state.database.commit()
+            await connection.executescript(
+                f"BEGIN IMMEDIATE;\n{_INIT_SQL}\n"
+                f"PRAGMA user_version = {_SCHEMA_VERSION};\nCOMMIT;"
+            )
 
-    logger.info("Database has been initialized.")
+            logger.info("Database has been initialized.")
+
+        else:
+
+            logger.info("Database is already initialized.")
 
     try:
 
@@ -90,45 +132,58 @@ async def lifespan_event(app: FastAPI) -> AsyncGenerator[None, None]:
 
     finally:
 
-        logger.info("Closing the connection to the database.")
+        # Streams of products hold a connection until they are consumed.
+        for products_stream in list(app.state.products_streams.values()):
+
+            await products_stream.cancel()
 
-        await app.state.database.close()
+        logger.info("Closing the connections to the database.")
+
+        await app.state.pool.close()
 
         logger.info("Logger is stopping.")
 
         stop_logging()
 
 
-async def get_db_connection(request: Request) -> aiosqlite.Connection:
-    """Get current database connection.
+async def get_reader(
+    request: Request,
+) -> AsyncGenerator[aiosqlite.Connection, None]:
+    """Get a reader connection from the pool for the duration of the request.
 
     Parameters
     ----------
     request : Request
         Received request from client.
 
-    Returns
-    -------
+    Yields
+    ------
     aiosqlite.Connection
-        Connection to the database.
+        Connection to the database that is used for reading.
     """
-    return request.app.state.database
+    async with request.app.state.pool.acquire() as connection:
+
+        yield connection
 
 
-async def get_gemini_recommender(request: Request) -> GeminiRecommender:
-    """Get current GeminiRecommender class.
+async def get_writer(
+    request: Request,
+) -> AsyncGenerator[aiosqlite.Connection, None]:
+    """Get exclusive access to the writer connection for the request.
 
     Parameters
     ----------
     request : Request
         Received request from client.
 
-    Returns
-    -------
-    GeminiRecommender
-        Recommender that uses GeminiAPI.
+    Yields
+    ------
+    aiosqlite.Connection
+        Connection to the database that is used for writing.
     """
-    return request.app.state.gemini_recommender
+    async with request.app.state.pool.acquire_writer() as connection:
+
+        yield connection
 
 
 async def verify_api_key(
@@ -159,8 +214,34 @@ async def verify_api_key(
     return True
 
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the client already has the representation with the ETag.
+
+    Parameters
+    ----------
+    request : Request
+        Received request from client.
+    etag : str
+        ETag of the current representation.
+
+    Returns
+    -------
+    bool
+        True if If-None-Match header of the request matches the ETag.
+    """
+    if_none_match = request.headers.get("if-none-match")
+
+    if if_none_match is None:
+
+        return False
+
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+
 app = FastAPI(lifespan=lifespan_event)
 
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 
 @app.exception_handler(aiosqlite.Error)
 async def database_error_exception_handler(
@@ -169,8 +250,6 @@ async def database_error_exception_handler(
 
     logger.error("Caught an database error.", exc_info=True)
 
-    await request.app.state.database.rollback()
-
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
@@ -184,8 +263,6 @@ async def gemini_api_exception_handler(request: Request, exc: APIError) -> JSONR
 
     logger.error("Caught an error while sending API request to Gemini.", exc_info=True)
 
-    await request.app.state.database.rollback()
-
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": exc.message},
@@ -201,8 +278,6 @@ async def pet_store_custom_exceptions_handler(
         "Caught an error while sending API request to the store itself.", exc_info=True
     )
 
-    await request.app.state.database.rollback()
-
     return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 
@@ -211,28 +286,58 @@ async def pet_store_custom_exceptions_handler(
     summary="Check health",
     description="Get status of components of the API.",
 )
-async def api_status(
-    connection: Annotated[aiosqlite.Connection, Depends(get_db_connection)]
-) -> JSONResponse:
-    database_alive = True
+async def api_status(request: Request) -> ApiStatus:
+    state = request.app.state
+    now = time.monotonic()
 
-    if not connection:
+    if state.database_check is None or (
+        state.database_check.done()
+        and now - state.last_db_check >= _STATUS_CHECK_INTERVAL
+    ):
 
-        database_alive = False
+        state.last_db_check = now
 
-    try:
+        state.database_check = asyncio.create_task(_check_database(state.pool))
+
+    # Probes that arrive during the check wait for its result. A cancelled probe
+    # must not cancel the check shared with the others.
+    database_alive = await asyncio.shield(state.database_check)
 
-        async with connection.cursor() as cursor:
+    return ApiStatus(database_status=database_alive)
+
+
+async def _check_database(pool: ConnectionPool) -> bool:
+    """Check whether the database answers a query.
+
+    Parameters
+    ----------
+    pool : ConnectionPool
+        Pool of connections to the database.
+
+    Returns
+    -------
+    bool
+        True if a query succeeded within _STATUS_CHECK_TIMEOUT seconds.
+    """
 
-            await cursor.execute("SELECT 1;")
+    async def select_one() -> None:
+        async with pool.acquire() as connection:
+
+            async with connection.execute("SELECT 1;"):
+
+                pass
+
+    try:
+
+        await asyncio.wait_for(select_one(), timeout=_STATUS_CHECK_TIMEOUT)
 
     except Exception:
 
-        database_alive = False
+        logger.error("Database did not answer the status check.", exc_info=True)
 
-    return JSONResponse(
-        content={"database_status": database_alive}, status_code=status.HTTP_200_OK
-    )
+        return False
+
+    return True
 
 
 @app.get(
@@ -241,24 +346,89 @@ async def api_status(
     summary="All products",
     description="Get all products from the database.",
     responses={
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "Returns in case products did not change since the ETag "
+            "passed in If-None-Match header.",
+        },
         status.HTTP_500_INTERNAL_SERVER_ERROR: {
             "model": DefaultErrorModel,
             "description": "Returns in case of a problem with Database Operations.",
-        }
+        },
     },
 )
-async def get_products(
-    connection: Annotated[aiosqlite.Connection, Depends(get_db_connection)]
-) -> JSONResponse:
+async def get_products(request: Request) -> Response:
     logger.info("Request for all products in the database accepted.")
 
-    products = await select_products(connection=connection)
+    async with request.app.state.pool.acquire() as connection:
 
-    logger.info(
-        f"Number of all extracted products from the database: {len(products.root)}."
+        version = await select_products_version(connection)
+
+    etag = f'W/"{version}"'
+
+    if _etag_matches(request, etag):
+
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    # Concurrent requests for the same version of products share a single
+    # query to the database. The stream is forgotten once the query is done, so
+    # later requests query again. Until then, the stream buffers every product
+    # it read, for readers that joined late, without waiting for slow clients.
+    products_streams = request.app.state.products_streams
+
+    products_stream = products_streams.get(version)
+
+    if products_stream is None:
+
+        products_stream = products_streams[version] = SharedStream(
+            _stream_products(request.app.state.pool)
+        )
+
+        products_stream.add_done_callback(lambda: products_streams.pop(version, None))
+
+    # Errors of the query are raised here, before the status is sent.
+    await products_stream.wait_started()
+
+    return StreamingResponse(
+        products_stream, media_type="application/json", headers={"ETag": etag}
     )
 
-    return JSONResponse(content=products.model_dump(), status_code=status.HTTP_200_OK)
+
+async def _stream_products(pool: ConnectionPool) -> AsyncGenerator[bytes, None]:
+    """Stream all products from the database as a JSON array.
+
+    The connection is acquired by the generator itself, so it is held only
+    while the products are being read. Nothing is yielded before the first
+    batch is fetched, so a failing query raises before any byte is sent.
+
+    Parameters
+    ----------
+    pool : ConnectionPool
+        Pool of connections to the database.
+
+    Yields
+    ------
+    bytes
+        Chunks of the JSON array, one batch of products per chunk.
+    """
+    number_of_products = 0
+
+    async with pool.acquire() as connection:
+
+        async for products in iter_product_batches(connection):
+
+            chunk = b",".join([orjson.dumps(product) for product in products])
+
+            yield (b"," if number_of_products else b"[") + chunk
+
+            number_of_products += len(products)
+
+    yield b"]" if number_of_products else b"[]"
+
+    logger.info(
+        f"Number of all extracted products from the database: {number_of_products}."
+    )
 
 
 @app.get(
@@ -267,6 +437,10 @@ async def get_products(
     summary="A specific product",
     description="Get a specific product from the database by its product_id",
     responses={
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "Returns in case the product did not change since the "
+            "ETag passed in If-None-Match header.",
+        },
         status.HTTP_404_NOT_FOUND: {
             "model": DefaultErrorModel,
             "description": "Returns in case a product with such id does not exist.",
@@ -286,22 +460,80 @@ async def get_product(
             description="Id of the product to fetch from the database.",
         ),
     ],
-    connection: Annotated[aiosqlite.Connection, Depends(get_db_connection)],
-) -> JSONResponse:
+    request: Request,
+) -> Response:
     logger.info(
         f"Request for selecting info about a product with product_id={id} accepted."
     )
 
-    product = await select_product(id, connection)
+    loaded = await request.app.state.product_loader.load(id)
+
+    if isinstance(loaded, NotFound):
+
+        logger.info(f"Product with product_id={id} is not in the database.")
+
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND, content={"detail": loaded.detail}
+        )
+
+    version, product = loaded
+
+    # Like for the list of products, the version of products in the database is
+    # the ETag, so a change made by any worker changes it.
+    etag = f'W/"{version}"'
+
+    if _etag_matches(request, etag):
+
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    content = product.model_dump_json()
+
+    logger.info(f"Info about the extracted product: {content}.")
+
+    return Response(
+        content=content, media_type="application/json", headers={"ETag": etag}
+    )
+
 
-    logger.info(f"Info about the extracted product: {product.model_dump_json()}.")
+@app.post(
+    "/api/products/batch",
+    summary="Several specific products",
+    description="Get several products from the database by their product_ids. "
+    "Ids that are not in the database are skipped.",
+    responses={
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {
+            "model": DefaultErrorModel,
+            "description": "Returns in case of a problem with Database Operations.",
+        },
+    },
+)
+async def post_products_batch(
+    batch: ProductIdBatch,
+    connection: Annotated[aiosqlite.Connection, Depends(get_reader)],
+) -> ProductWithIdList:
+    logger.info(
+        f"Request for selecting products with product_ids={batch.ids} accepted."
+    )
 
-    return JSONResponse(content=product.model_dump(), status_code=status.HTTP_200_OK)
+    product_ids = list(dict.fromkeys(batch.ids))
+
+    products = await select_products_by_ids(product_ids, connection)
+
+    logger.info(f"Number of extracted products from the database: {len(products)}.")
+
+    return ProductWithIdList.model_construct(
+        root=[
+            products[product_id][1]
+            for product_id in product_ids
+            if product_id in products
+        ]
+    )
 
 
 @app.post(
     "/api/product",
-    response_model=ProductWithId,
     summary="Create product",
     description="Add a new product into the database. Required authorization to access.",
     responses={
@@ -317,9 +549,10 @@ async def get_product(
 )
 async def post_product(
     product: Product,
-    connection: Annotated[aiosqlite.Connection, Depends(get_db_connection)],
+    # The key is checked first, so rejected requests never wait for the writer.
     _: Annotated[bool, Depends(verify_api_key)],
-) -> JSONResponse:
+    connection: Annotated[aiosqlite.Connection, Depends(get_writer)],
+) -> ProductWithId:
     logger.info(
         f"Request for inserting a new product into the database {product.model_dump_json()} accepted."
     )
@@ -330,14 +563,11 @@ async def post_product(
         f"Insrted product into the database: {product_with_id.model_dump_json()}."
     )
 
-    return JSONResponse(
-        content=product_with_id.model_dump(), status_code=status.HTTP_200_OK
-    )
+    return product_with_id
 
 
 @app.put(
     "/api/product/{id}",
-    response_model=ProductWithId,
     summary="Update existing product",
     description="Update existing product with new values by its product_id.",
     responses={
@@ -365,9 +595,9 @@ async def put_product(
         ),
     ],
     product: ProductUpdate,
-    connection: Annotated[aiosqlite.Connection, Depends(get_db_connection)],
     _: Annotated[bool, Depends(verify_api_key)],
-) -> JSONResponse:
+    connection: Annotated[aiosqlite.Connection, Depends(get_writer)],
+) -> ProductWithId:
     logger.info(
         f"Request for changing product_id={id} with params={product.model_dump_json()} accepted."
     )
@@ -376,9 +606,7 @@ async def put_product(
 
     logger.info(f"Changed product {product_with_id.model_dump_json()}.")
 
-    return JSONResponse(
-        content=product_with_id.model_dump(), status_code=status.HTTP_200_OK
-    )
+    return product_with_id
 
 
 @app.delete(
@@ -410,8 +638,8 @@ async def delete_product(
             description="Id of the product you want to delete.",
         ),
     ],
-    connection: Annotated[aiosqlite.Connection, Depends(get_db_connection)],
     _: Annotated[bool, Depends(verify_api_key)],
+    connection: Annotated[aiosqlite.Connection, Depends(get_writer)],
 ) -> Response:
     logger.info(f"Request for deleting product_id={id} accepted.")
 
@@ -424,7 +652,6 @@ async def delete_product(
 
 @app.post(
     "/app/products/{id}/sell",
-    response_model=ProductWithId,
     summary="Sell existing product",
     description="Sell specified amount of existing product from the database by its product_id.",
     responses={
@@ -454,9 +681,9 @@ async def post_product_sell(
         ),
     ],
     quantity: RequestedSellingQuantity,
-    connection: Annotated[aiosqlite.Connection, Depends(get_db_connection)],
     _: Annotated[bool, Depends(verify_api_key)],
-) -> JSONResponse:
+    connection: Annotated[aiosqlite.Connection, Depends(get_writer)],
+) -> ProductWithId:
     logger.info(
         f"Request for selling quantity={quantity.quantity} of product_id={id} accepted."
     )
@@ -467,14 +694,11 @@ async def post_product_sell(
         f"Product has bee sold. New product is {left_product.model_dump_json()}."
     )
 
-    return JSONResponse(
-        content=left_product.model_dump(), status_code=status.HTTP_200_OK
-    )
+    return left_product
 
 
 @app.post(
     "/app/recommendation",
-    response_model=Recommendation,
     summary="Get a recommendation",
     description="Ask an LLM model like Gemini 2.5 Flash which food will suit your pet best.",
     responses={
@@ -490,14 +714,14 @@ async def post_product_sell(
 )
 async def post_recommendation(
     description: RecommendationPetDescription,
-    gemini_recommender: Annotated[GeminiRecommender, Depends(get_gemini_recommender)],
-) -> JSONResponse:
+    request: Request,
+) -> Recommendation:
     logger.info(
         f"Request for a recommendation with description {description.model_dump_json()} accepted."
     )
 
-    response = await gemini_recommender.recommend(description)
+    response = await request.app.state.gemini_recommender.recommend(description)
 
     logger.info(f"Received recommendation {response.model_dump_json()}.")
 
-    return JSONResponse(content=response.model_dump(), status_code=status.HTTP_200_OK)
+    return response
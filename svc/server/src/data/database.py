@@ -0,0 +1,156 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
+
+PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-64000",
+    "mmap_size=268435456",
+    "busy_timeout=30000",
+    "foreign_keys=ON",
+)
+
+STATEMENT_CACHE_SIZE = 256
+
+
+def default_pool_size() -> int:
+    """Get the default number of connections in the pool.
+
+    Every worker process opens its own pool, so ``2 * cores + 1`` connections
+    are divided between the WEB_CONCURRENCY workers.
+
+    Returns
+    -------
+    int
+        Value of DATABASE_POOL_SIZE environment variable, or
+        ``(2 * cores + 1) // workers``, but at least 3.
+    """
+    if "DATABASE_POOL_SIZE" in os.environ:
+
+        return int(os.environ["DATABASE_POOL_SIZE"])
+
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+    return max(((os.cpu_count() or 1) * 2 + 1) // workers, 3)
+
+
+class ConnectionPool:
+    """Pool of aiosqlite connections to the same database.
+
+    Every aiosqlite connection runs its queries in its own thread, so reads
+    that go through different connections do not queue behind each other. One
+    connection is dedicated to writes and the rest are handed out to readers,
+    which are opened with ``query_only`` so they can not modify the database.
+    Every connection runs in WAL mode, so readers are not blocked by the writer.
+    Connections are in autocommit mode, every statement commits by itself.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite database.
+    size : int
+        Total number of connections, including the writer one.
+    """
+
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self.size = max(size, 2)
+        self.writer: Optional[aiosqlite.Connection] = None
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._writer_lock = asyncio.Lock()
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        connection = await aiosqlite.connect(
+            self.path, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE
+        )
+
+        for pragma in PRAGMAS:
+
+            await connection.execute(f"PRAGMA {pragma};")
+
+        if read_only:
+
+            await connection.execute("PRAGMA query_only=ON;")
+
+        return connection
+
+    async def open(self) -> None:
+        """Open the writer connection and all reader connections."""
+        self.writer = await self._connect(read_only=False)
+
+        # Refreshes statistics of tables that changed a lot since the last run,
+        # as recommended for long-lived connections.
+        await self.writer.execute("PRAGMA optimize=0x10002;")
+
+        for _ in range(self.size - 1):
+
+            connection = await self._connect(read_only=True)
+
+            self._all_readers.append(connection)
+
+            self._readers.put_nowait(connection)
+
+    async def close(self) -> None:
+        """Close every connection of the pool."""
+        for connection in self._all_readers:
+
+            await connection.close()
+
+        self._all_readers.clear()
+
+        if self.writer is not None:
+
+            await self.writer.execute("PRAGMA optimize;")
+
+            await self.writer.close()
+
+            self.writer = None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Acquire a reader connection from the pool.
+
+        Yields
+        ------
+        aiosqlite.Connection
+            Connection that must be used only for reading.
+        """
+        connection = await self._readers.get()
+
+        try:
+
+            yield connection
+
+        finally:
+
+            self._readers.put_nowait(connection)
+
+    @asynccontextmanager
+    async def acquire_writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Acquire exclusive access to the writer connection.
+
+        A transaction left open by the holder, e.g. because of an exception, is
+        rolled back before the connection is handed to the next one.
+
+        Yields
+        ------
+        aiosqlite.Connection
+            The only connection that is allowed to modify the database.
+        """
+        async with self._writer_lock:
+
+            try:
+
+                yield self.writer
+
+            finally:
+
+                if self.writer.in_transaction:
+
+                    await self.writer.rollback()
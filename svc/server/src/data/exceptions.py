@@ -1,4 +1,5 @@
 from fastapi import HTTPException, status
+from src.data.models import NotFound
 
 
 class PetStoreException(HTTPException):
@@ -31,7 +32,7 @@ class ProductNotFound(PetStoreException):
 
         super(ProductNotFound, self).__init__(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Product with product_id={product_id} is not in the database.",
+            detail=NotFound(product_id).detail,
         )
 
 
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Dict, List, Set, Tuple, Union
+
+from src.data.database import ConnectionPool
+from src.data.models import NotFound, ProductWithId
+from src.data.queries import select_products_by_ids
+
+
+class ProductLoader:
+    """Coalesce concurrent lookups of products by id into batched queries.
+
+    Every id requested during the same iteration of the event loop is fetched
+    with a single ``SELECT ... WHERE product_id IN (...)`` query, instead of
+    one query per request.
+
+    Parameters
+    ----------
+    pool : ConnectionPool
+        Pool of connections to the database.
+    """
+
+    def __init__(self, pool: ConnectionPool) -> None:
+        self.pool = pool
+        self._pending: Dict[int, List[asyncio.Future]] = {}
+        self._scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, product_id: int) -> Union[Tuple[int, ProductWithId], NotFound]:
+        """Load a product by its id.
+
+        Parameters
+        ----------
+        product_id : int
+            Id of the product to load.
+
+        Returns
+        -------
+        Union[Tuple[int, ProductWithId], NotFound]
+            Version of products the product was read at and the product with
+            such id, or NotFound if it is not in the database.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        self._pending.setdefault(product_id, []).append(future)
+
+        if not self._scheduled:
+
+            self._scheduled = True
+
+            task = asyncio.create_task(self._dispatch())
+
+            self._tasks.add(task)
+
+            task.add_done_callback(self._tasks.discard)
+
+        return await future
+
+    async def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+
+        product_ids = list(pending)
+
+        try:
+
+            async with self.pool.acquire() as connection:
+
+                products = await select_products_by_ids(product_ids, connection)
+
+        except Exception as exc:
+
+            for futures in pending.values():
+
+                for future in futures:
+
+                    if not future.done():
+
+                        future.set_exception(exc)
+
+            return
+
+        for product_id, futures in pending.items():
+
+            product = products.get(product_id, NotFound(product_id=product_id))
+
+            for future in futures:
+
+                if not future.done():
+
+                    future.set_result(product)
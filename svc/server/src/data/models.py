@@ -1,6 +1,7 @@
+from dataclasses import dataclass
 from typing import List, Optional
 
-from pydantic import BaseModel, Field, RootModel
+from pydantic import BaseModel, Field, RootModel, TypeAdapter
 
 
 class Product(BaseModel):
@@ -90,12 +91,71 @@ class Recommendation(BaseModel):
     reason: str = Field(description="Explanation about why this product suits the pet.")
 
 
+class ProductIdBatch(BaseModel):
+    """Ids of products to fetch at once."""
+
+    ids: List[int] = Field(
+        min_length=1,
+        max_length=100,
+        title="Product IDs",
+        description="Ids of the products to fetch. At most 100 per request.",
+        example=[1, 2, 3],
+    )
+
+
 class ProductWithIdList(RootModel):
     """List of products with ID."""
 
     root: List[ProductWithId]
 
 
+_PRODUCT_LIST_TA = TypeAdapter(List[ProductWithId])
+
+
+def dump_product_list_json(products: ProductWithIdList) -> bytes:
+    """Serialize a list of products to JSON without validating it.
+
+    Parameters
+    ----------
+    products : ProductWithIdList
+        Products to serialize.
+
+    Returns
+    -------
+    bytes
+        Compact JSON array of the products.
+    """
+    return _PRODUCT_LIST_TA.dump_json(products.root)
+
+
+@dataclass(frozen=True)
+class NotFound:
+    """Result of a lookup of a product that is not in the database.
+
+    Returned instead of raising ProductNotFound on paths where a missing
+    product is an expected outcome rather than an error.
+    """
+
+    product_id: int
+
+    @property
+    def detail(self) -> str:
+        """Error message for the client.
+
+        Returns
+        -------
+        str
+            Message that says which product was not found.
+        """
+        return f"Product with product_id={self.product_id} is not in the database."
+
+
+class ApiStatus(BaseModel):
+    """Status of components of the API."""
+
+    database_status: bool = Field(description="Whether database is reachable.")
+
+
 class DefaultErrorModel(BaseModel):
     """Model for Swagger UI."""
 
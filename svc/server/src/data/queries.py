@@ -1,4 +1,4 @@
-from typing import Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 from aiosqlite import Connection
 from src.data.exceptions import (
@@ -8,6 +8,7 @@ from src.data.exceptions import (
     ProductNotFound,
 )
 from src.data.models import (
+    NotFound,
     Product,
     ProductUpdate,
     ProductWithId,
@@ -15,19 +16,75 @@ from src.data.models import (
     RequestedSellingQuantity,
 )
 
+# Statements are module-level constants, so every call passes the same string
+# and hits the statement cache of the connection.
+_PRODUCT_COLUMNS = (
+    "product_id, product_name, product_description, quantity, price, active"
+)
+
+_SQL_SELECT_PRODUCT = f"SELECT {_PRODUCT_COLUMNS} FROM products WHERE product_id=?;"
+
+_SQL_SELECT_PRODUCTS = f"SELECT {_PRODUCT_COLUMNS} FROM products;"
+
+_SQL_SELECT_PRODUCTS_VERSION = "SELECT version FROM products_version;"
+
+# The version is read by the same statement as the products, so it is exactly
+# the version they belong to.
+# Lists of ids are padded to one of these sizes, so only a few statements are
+# ever prepared. A list of placeholders, unlike a subquery, is always searched
+# by the primary key whatever the table statistics say.
+_ID_BATCH_SIZES = (1, 8, 32, 100)
+
+_SQL_SELECT_PRODUCTS_BY_IDS = {
+    size: f"SELECT {_PRODUCT_COLUMNS}, (SELECT version FROM products_version) "
+    f"FROM products WHERE product_id IN ({', '.join('?' * size)});"
+    for size in _ID_BATCH_SIZES
+}
+
+_SQL_SELECT_ACTIVE_NONZERO_PRODUCTS = (
+    f"SELECT {_PRODUCT_COLUMNS} FROM products WHERE active=1 AND quantity>0;"
+)
+
+_SQL_SELECT_STOCK = "SELECT quantity, active FROM products WHERE product_id=?;"
+
+_SQL_INSERT_PRODUCT = (
+    "INSERT INTO products "
+    "(product_name, product_description, quantity, price, active) "
+    f"VALUES (?, ?, ?, ?, ?) RETURNING {_PRODUCT_COLUMNS};"
+)
+
+# Filled with the SET clause, which depends on the fields being updated.
+_SQL_UPDATE_PRODUCT = (
+    "UPDATE products SET {} WHERE product_id=? RETURNING " + _PRODUCT_COLUMNS + ";"
+)
+
+_SQL_DEACTIVATE_PRODUCT = (
+    "UPDATE products SET active=false WHERE product_id=? "
+    f"RETURNING {_PRODUCT_COLUMNS};"
+)
+
+_SQL_SELL_PRODUCT = (
+    "UPDATE products SET quantity=quantity-? "
+    "WHERE product_id=? AND active=1 AND quantity>=? "
+    f"RETURNING {_PRODUCT_COLUMNS};"
+)
+
 
-async def _tuple2productWithId(item: Tuple) -> ProductWithId:
-    return ProductWithId(
+def _tuple2productWithId(item: Tuple) -> ProductWithId:
+    # Rows are already constrained by the schema, so validation is skipped.
+    return ProductWithId.model_construct(
         product_id=item[0],
         product_name=item[1],
         product_description=item[2],
         quantity=item[3],
-        price=item[4],
-        active=item[5],
+        price=float(item[4]),
+        active=bool(item[5]),
     )
 
 
-async def select_product(product_id: int, connection: Connection) -> ProductWithId:
+async def select_product(
+    product_id: int, connection: Connection
+) -> Union[ProductWithId, NotFound]:
     """Select a specific product by id.
 
     Parameters
@@ -39,29 +96,27 @@ async def select_product(product_id: int, connection: Connection) -> ProductWith
 
     Returns
     -------
-    ProductWithId
-        If such product exists returns this product.
-
-    Raises
-    ------
-    ProductNotFound
-        In case selected product does not exist.
+    Union[ProductWithId, NotFound]
+        If such product exists returns this product, otherwise NotFound.
     """
     async with connection.cursor() as cursor:
 
-        await cursor.execute("SELECT * FROM products WHERE product_id=?;", [product_id])
+        await cursor.execute(_SQL_SELECT_PRODUCT, [product_id])
 
         item = await cursor.fetchone()
 
     if item is None:
 
-        raise ProductNotFound(product_id=product_id)
+        return NotFound(product_id=product_id)
+
+    return _tuple2productWithId(item)
 
-    return await _tuple2productWithId(item)
 
+async def select_products_version(connection: Connection) -> int:
+    """Select version of table products.
 
-async def select_products(connection: Connection) -> ProductWithIdList:
-    """Select all products from table products.
+    The version is bumped by triggers on every insert, update, or delete, so it
+    changes whenever any process modifies products.
 
     Parameters
     ----------
@@ -70,22 +125,93 @@ async def select_products(connection: Connection) -> ProductWithIdList:
 
     Returns
     -------
-    ProductWithIdList
-        List of all products in the database.
+    int
+        Current version of table products.
     """
     async with connection.cursor() as cursor:
 
-        await cursor.execute("SELECT * FROM products;")
+        await cursor.execute(_SQL_SELECT_PRODUCTS_VERSION)
 
-        items = await cursor.fetchall()
+        item = await cursor.fetchone()
+
+    return item[0]
+
+
+async def iter_product_batches(
+    connection: Connection, batch_size: int = 256
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Iterate over all products from table products in batches.
+
+    Every batch is fetched with a single call to the connection thread, instead
+    of one call per row.
+
+    Parameters
+    ----------
+    connection : Connection
+        A connection to the database that contains products table.
+    batch_size : int
+        Maximal number of products in a batch.
+
+    Yields
+    ------
+    List[Dict[str, Any]]
+        Products in the same shape as serialized ProductWithId.
+    """
+    async with connection.execute(_SQL_SELECT_PRODUCTS) as cursor:
+
+        while items := await cursor.fetchmany(batch_size):
+
+            yield [
+                {
+                    "product_name": item[1],
+                    "product_description": item[2],
+                    "quantity": item[3],
+                    "price": float(item[4]),
+                    "active": bool(item[5]),
+                    "product_id": item[0],
+                }
+                for item in items
+            ]
+
+
+async def select_products_by_ids(
+    product_ids: List[int], connection: Connection
+) -> Dict[int, Tuple[int, ProductWithId]]:
+    """Select products with the given ids in a single query.
+
+    Parameters
+    ----------
+    product_ids : List[int]
+        Ids of products to select.
+    connection : Connection
+        A connection to the database that contains products table.
+
+    Returns
+    -------
+    Dict[int, Tuple[int, ProductWithId]]
+        Found products by their ids, with the version of products they were
+        read at. Ids that are not in the database are missing from the
+        dictionary.
+    """
+    items = []
+
+    async with connection.cursor() as cursor:
+
+        for start in range(0, len(product_ids), _ID_BATCH_SIZES[-1]):
+
+            batch = product_ids[start : start + _ID_BATCH_SIZES[-1]]
 
-    result = []
+            size = next(size for size in _ID_BATCH_SIZES if size >= len(batch))
 
-    for item in items:
-        product = await _tuple2productWithId(item)
-        result.append(product)
+            # Repeating an id does not change the result of IN.
+            await cursor.execute(
+                _SQL_SELECT_PRODUCTS_BY_IDS[size],
+                batch + batch[-1:] * (size - len(batch)),
+            )
 
-    return ProductWithIdList(result)
+            items.extend(await cursor.fetchall())
+
+    return {item[0]: (item[6], _tuple2productWithId(item)) for item in items}
 
 
 async def insert_product(product: Product, connection: Connection) -> ProductWithId:
@@ -106,19 +232,19 @@ async def insert_product(product: Product, connection: Connection) -> ProductWit
     async with connection.cursor() as cursor:
 
         await cursor.execute(
-            "INSERT INTO products "
-            "(product_name, product_description, quantity, price, active) "
-            "VALUES (?, ?, ?, ?, ?) "
-            "RETURNING "
-            "product_id, product_name, product_description, quantity, price, active;",
-            list(product.model_dump().values()),
+            _SQL_INSERT_PRODUCT,
+            (
+                product.product_name,
+                product.product_description,
+                product.quantity,
+                product.price,
+                product.active,
+            ),
         )
 
         result = await cursor.fetchone()
 
-    await connection.commit()
-
-    return await _tuple2productWithId(result)
+    return _tuple2productWithId(result)
 
 
 async def update_product(
@@ -126,6 +252,8 @@ async def update_product(
 ) -> ProductWithId:
     """Update product with new values.
 
+    The update is a single statement, which commits by itself.
+
     Parameters
     ----------
     product_id : int
@@ -145,17 +273,36 @@ async def update_product(
     ProductNotFound
         In case selected product does not exist.
     """
-    async with connection.cursor() as cursor:
+    # Column names come from the model definition, never from the request.
+    columns, values = [], []
+
+    for name in ProductUpdate.model_fields:
+
+        value = getattr(product, name)
+
+        if value is not None:
+
+            columns.append(name + "=?")
+
+            values.append(value)
+
+    # Nothing to update, an empty SET clause is not valid SQL.
+    if not columns:
+
+        existing = await select_product(product_id, connection)
+
+        if isinstance(existing, NotFound):
 
-        product_dict = product.model_dump(exclude_none=True)
+            raise ProductNotFound(product_id=product_id)
 
-        set_string = ", ".join([key + "=?" for key in product_dict.keys()])
+        return existing
+
+    set_string = ", ".join(columns)
+
+    async with connection.cursor() as cursor:
 
         await cursor.execute(
-            f"UPDATE products SET {set_string} WHERE product_id=? "
-            "RETURNING "
-            "product_id, product_name, product_description, quantity, price, active;",
-            (*list(product_dict.values()), product_id),
+            _SQL_UPDATE_PRODUCT.format(set_string), (*values, product_id)
         )
 
         result = await cursor.fetchone()
@@ -164,9 +311,7 @@ async def update_product(
 
         raise ProductNotFound(product_id=product_id)
 
-    await connection.commit()
-
-    return await _tuple2productWithId(result)
+    return _tuple2productWithId(result)
 
 
 async def deactivate_product(
@@ -193,12 +338,7 @@ async def deactivate_product(
     """
     async with connection.cursor() as cursor:
 
-        await cursor.execute(
-            "UPDATE products SET active=false WHERE product_id=? "
-            "RETURNING "
-            "product_id, product_name, product_description, quantity, price, active;",
-            [product_id],
-        )
+        await cursor.execute(_SQL_DEACTIVATE_PRODUCT, [product_id])
 
         result = await cursor.fetchone()
 
@@ -206,9 +346,7 @@ async def deactivate_product(
 
         raise ProductNotFound(product_id=product_id)
 
-    await connection.commit()
-
-    return await _tuple2productWithId(result)
+    return _tuple2productWithId(result)
 
 
 async def sell_product(
@@ -216,6 +354,9 @@ async def sell_product(
 ) -> ProductWithId:
     """Sell a specific amount of product.
 
+    The stock is checked and decreased by a single statement, which commits by
+    itself.
+
     Parameters
     ----------
     product_id : int
@@ -238,39 +379,36 @@ async def sell_product(
         In case selected product does not have a sufficient amount of items
         available.
     ProductNotFound
-        In case selected product does not exist, is not active, or does not have
-        enought quantity.
+        In case selected product does not exist.
     """
-    product = await select_product(product_id, connection)
+    async with connection.cursor() as cursor:
 
-    if not product.active:
+        await cursor.execute(
+            _SQL_SELL_PRODUCT, [quantity.quantity, product_id, quantity.quantity]
+        )
 
-        raise ProductIsNotActive(product_id)
+        left_product = await cursor.fetchone()
 
-    if product.quantity < quantity.quantity:
+        if left_product is not None:
 
-        raise ProductNoSufficientStock(product_id, product.quantity)
+            return _tuple2productWithId(left_product)
 
-    async with connection.cursor() as cursor:
+        # Nothing was sold, find out why.
+        await cursor.execute(_SQL_SELECT_STOCK, [product_id])
 
-        new_quantity = product.quantity - quantity.quantity
+        product = await cursor.fetchone()
 
-        await cursor.execute(
-            "UPDATE products SET quantity=? WHERE product_id=? "
-            "RETURNING "
-            "product_id, product_name, product_description, quantity, price, active;",
-            [new_quantity, product_id],
-        )
+    if product is None:
 
-        left_product = await cursor.fetchone()
+        raise ProductNotFound(product_id=product_id)
 
-    if left_product is None:
+    available_quantity, active = product
 
-        raise ProductNotFound(product_id=product_id)
+    if not active:
 
-    await connection.commit()
+        raise ProductIsNotActive(product_id)
 
-    return await _tuple2productWithId(left_product)
+    raise ProductNoSufficientStock(product_id, available_quantity)
 
 
 async def select_active_nonzero_products(connection: Connection) -> ProductWithIdList:
@@ -293,7 +431,7 @@ async def select_active_nonzero_products(connection: Connection) -> ProductWithI
     """
     async with connection.cursor() as cursor:
 
-        await cursor.execute("SELECT * FROM products WHERE active=true AND quantity>0;")
+        await cursor.execute(_SQL_SELECT_ACTIVE_NONZERO_PRODUCTS)
 
         items = await cursor.fetchall()
 
@@ -301,6 +439,6 @@ async def select_active_nonzero_products(connection: Connection) -> ProductWithI
 
         raise NoActiveProducts()
 
-    result = [await _tuple2productWithId(item) for item in items]
-
-    return ProductWithIdList(result)
+    return ProductWithIdList.model_construct(
+        root=[_tuple2productWithId(item) for item in items]
+    )
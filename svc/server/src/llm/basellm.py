@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 
-from aiosqlite import Connection
+from src.data.database import ConnectionPool
 from src.data.models import Recommendation, RecommendationPetDescription
 
 
@@ -9,13 +9,13 @@ class BaseLLMRecommender(ABC):
 
     Parameters
     ----------
-    connection : Connection
-        Connection to the database.
+    pool : ConnectionPool
+        Pool of connections to the database.
     """
 
-    def __init__(self, connection: Connection) -> None:
+    def __init__(self, pool: ConnectionPool) -> None:
         super(BaseLLMRecommender, self).__init__()
-        self.connection = connection
+        self.pool = pool
 
     @abstractmethod
     async def recommend(
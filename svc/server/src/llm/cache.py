@@ -0,0 +1,144 @@
+import math
+import operator
+import re
+import time
+from dataclasses import dataclass
+from typing import Container, FrozenSet, List, Optional, Sequence
+
+from src.data.models import Recommendation
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+@dataclass
+class _CacheEntry:
+    numbers: FrozenSet[str]
+    embedding: List[float]
+    recommendation: Recommendation
+    expires_at: float
+
+
+def _normalize(embedding: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(value * value for value in embedding)) or 1.0
+
+    return [value / norm for value in embedding]
+
+
+class RecommendationCache:
+    """Semantic cache of recommendations keyed by pet description embeddings.
+
+    A cached recommendation is reused when a new description is close enough to
+    an already answered one. Descriptions are compared only when they mention
+    exactly the same numbers, so "5 years, 10 kg" never reuses the answer for
+    "15 years, 40 kg" however similar the rest of the text is.
+
+    The list of entries is replaced, never modified in place, so ``get`` can
+    scan it from a worker thread while ``put`` runs on the event loop.
+
+    Parameters
+    ----------
+    threshold : float
+        Minimal cosine similarity between embeddings to consider a hit.
+    ttl : float
+        Number of seconds a recommendation is kept in the cache.
+    maxsize : int
+        Maximal number of recommendations kept in the cache.
+    """
+
+    def __init__(
+        self, threshold: float = 0.92, ttl: float = 3600, maxsize: int = 256
+    ) -> None:
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: List[_CacheEntry] = []
+
+    @staticmethod
+    def _numbers(description: str) -> FrozenSet[str]:
+        return frozenset(_NUMBER_PATTERN.findall(description))
+
+    def get(
+        self,
+        description: str,
+        embedding: Sequence[float],
+        product_ids: Optional[Container[int]] = None,
+    ) -> Optional[Recommendation]:
+        """Find a recommendation for a similar description.
+
+        Parameters
+        ----------
+        description : str
+            Description of the pet.
+        embedding : Sequence[float]
+            Embedding of the description.
+        product_ids : Optional[Container[int]]
+            Ids of products that can still be recommended. Recommendations of
+            other products are skipped.
+
+        Returns
+        -------
+        Optional[Recommendation]
+            Cached recommendation, if a similar enough description was seen.
+        """
+        numbers = self._numbers(description)
+        embedding = _normalize(embedding)
+        now = time.monotonic()
+
+        best_similarity, best_entry = self.threshold, None
+
+        for entry in self._entries:
+
+            if entry.expires_at < now or entry.numbers != numbers:
+
+                continue
+
+            if (
+                product_ids is not None
+                and entry.recommendation.product_id not in product_ids
+            ):
+
+                continue
+
+            similarity = sum(map(operator.mul, entry.embedding, embedding))
+
+            if similarity >= best_similarity:
+
+                best_similarity, best_entry = similarity, entry
+
+        return best_entry.recommendation if best_entry else None
+
+    def put(
+        self,
+        description: str,
+        embedding: Sequence[float],
+        recommendation: Recommendation,
+    ) -> None:
+        """Store a recommendation for the description.
+
+        Parameters
+        ----------
+        description : str
+            Description of the pet.
+        embedding : Sequence[float]
+            Embedding of the description.
+        recommendation : Recommendation
+            Recommendation generated for the description.
+        """
+        now = time.monotonic()
+
+        entries = [entry for entry in self._entries if entry.expires_at >= now]
+
+        if len(entries) >= self.maxsize:
+
+            entries = entries[len(entries) - self.maxsize + 1 :]
+
+        entries.append(
+            _CacheEntry(
+                numbers=self._numbers(description),
+                embedding=_normalize(embedding),
+                recommendation=recommendation,
+                expires_at=now + self.ttl,
+            )
+        )
+
+        self._entries = entries
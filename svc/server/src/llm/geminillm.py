@@ -1,44 +1,32 @@
-import json
-
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional
+
+import aiohttp
+import httpx
+import orjson
 from google import genai
-from src.data.models import Recommendation, RecommendationPetDescription
-from src.data.queries import select_active_nonzero_products
+from google.genai.errors import APIError
+from src.data.models import (
+    Recommendation,
+    RecommendationPetDescription,
+    dump_product_list_json,
+)
+from src.data.queries import select_active_nonzero_products, select_products_version
 from src.llm.basellm import BaseLLMRecommender
+from src.llm.cache import RecommendationCache
 from typing_extensions import override
 
+logger = logging.getLogger(__name__)
 
-class GeminiRecommender(BaseLLMRecommender):
-    """Recommender class with Gemini.
-
-    Parameters
-    ----------
-    api_key : str
-        Token to access Gemini API. Can be obtained in the Google AI Studio.
-    """
-
-    def __init__(self, api_key: str, **kwargs) -> None:
+_SYSTEM_INSTRUCTIONS = [
+    "You are an expert **Product Recommendation Engine** for a database of retail products.",
+    "Your task is to recommend the single best-suited product based on a given product catalog structure and a user's description.",
+]
 
-        super(GeminiRecommender, self).__init__(**kwargs)
-
-        self.api_key = api_key
-
-        self.client = genai.Client(api_key=self.api_key)
-
-        self.aio_client = self.client.aio
-
-    @override
-    async def recommend(
-        self, description: RecommendationPetDescription
-    ) -> Recommendation:
-
-        active_products_list = await select_active_nonzero_products(self.connection)
-
-        system_instructions = [
-            "You are an expert **Product Recommendation Engine** for a database of retail products.",
-            "Your task is to recommend the single best-suited product based on a given product catalog structure and a user's description.",
-        ]
-
-        query = f"""
+# Filled with str.format, braces of the output example are escaped.
+_QUERY_TEMPLATE = """
         ---
 
         ### **INPUT DATA STRUCTURES**
@@ -49,12 +37,12 @@ class GeminiRecommender(BaseLLMRecommender):
 
         2.  **Product Catalog Data:**
             ```json
-            {active_products_list.model_dump_json(indent=4)}
+            {catalog_json}
             ```
 
         3.  **User Description:**
             ```json
-            {description.model_dump_json(indent=4)}
+            {description_json}
             ```
 
         ---
@@ -77,14 +65,157 @@ class GeminiRecommender(BaseLLMRecommender):
             }}
         """
 
+
+@dataclass(frozen=True)
+class _Catalog:
+    version: int
+    product_ids: FrozenSet[int]
+    json: str
+
+
+class GeminiRecommender(BaseLLMRecommender):
+    """Recommender class with Gemini.
+
+    Parameters
+    ----------
+    api_key : str
+        Token to access Gemini API. Can be obtained in the Google AI Studio.
+    """
+
+    def __init__(self, api_key: str, **kwargs) -> None:
+
+        super(GeminiRecommender, self).__init__(**kwargs)
+
+        self.api_key = api_key
+
+        self.client = genai.Client(api_key=self.api_key)
+
+        self.aio_client = self.client.aio
+
+        self.cache = RecommendationCache()
+
+        self._catalog: Optional[_Catalog] = None
+
+        self._catalog_lock = asyncio.Lock()
+
+        self._generate_config = genai.types.GenerateContentConfig(
+            system_instruction=_SYSTEM_INSTRUCTIONS
+        )
+
+    async def _embed(
+        self, description: RecommendationPetDescription
+    ) -> Optional[List[float]]:
+        """Embed description of the pet for the semantic cache.
+
+        Parameters
+        ----------
+        description : RecommendationPetDescription
+            Description of the pet.
+
+        Returns
+        -------
+        Optional[List[float]]
+            Embedding of the description, or None if it could not be obtained.
+        """
+        try:
+
+            response = await self.aio_client.models.embed_content(
+                model="gemini-embedding-001",
+                contents=description.description,
+                config=genai.types.EmbedContentConfig(
+                    task_type="SEMANTIC_SIMILARITY", output_dimensionality=256
+                ),
+            )
+
+        # The cache is only an optimization, a failed embedding must not fail the
+        # recommendation.
+        except (APIError, aiohttp.ClientError, httpx.HTTPError, TimeoutError):
+
+            logger.warning("Could not embed the pet description.", exc_info=True)
+
+            return None
+
+        return response.embeddings[0].values
+
+    async def _get_catalog(self) -> _Catalog:
+        """Get the catalog of active products in stock serialized to JSON.
+
+        The serialized catalog is reused for as long as version of products in
+        the database stays the same.
+
+        Returns
+        -------
+        _Catalog
+            Ids and JSON of the products for the current version.
+        """
+        async with self.pool.acquire() as connection:
+
+            version = await select_products_version(connection)
+
+        async with self._catalog_lock:
+
+            if self._catalog is None or self._catalog.version != version:
+
+                async with self.pool.acquire() as connection:
+
+                    active_products_list = await select_active_nonzero_products(
+                        connection
+                    )
+
+                # Large catalogs take a while to serialize, keep it off the loop.
+                catalog_json = await asyncio.to_thread(
+                    dump_product_list_json, active_products_list
+                )
+
+                self._catalog = _Catalog(
+                    version=version,
+                    product_ids=frozenset(
+                        product.product_id for product in active_products_list.root
+                    ),
+                    json=catalog_json.decode(),
+                )
+
+            return self._catalog
+
+    @override
+    async def recommend(
+        self, description: RecommendationPetDescription
+    ) -> Recommendation:
+
+        embedding, catalog = await asyncio.gather(
+            self._embed(description), self._get_catalog()
+        )
+
+        if embedding is not None:
+
+            # Every sale changes the catalog, so cached recommendations are kept
+            # for as long as their product is still on sale. Comparing with
+            # every cached embedding takes milliseconds, keep it off the loop.
+            recommendation = await asyncio.to_thread(
+                self.cache.get, description.description, embedding, catalog.product_ids
+            )
+
+            if recommendation is not None:
+
+                return recommendation
+
+        query = _QUERY_TEMPLATE.format(
+            catalog_json=catalog.json,
+            description_json=description.model_dump_json(indent=4),
+        )
+
         response = await self.aio_client.models.generate_content(
             model="gemini-2.5-flash",
             contents=query,
-            config=genai.types.GenerateContentConfig(
-                system_instruction=system_instructions
-            ),
+            config=self._generate_config,
         )
 
-        response_dict = json.loads(response.text)
+        response_dict = orjson.loads(response.text)
+
+        recommendation = Recommendation(**response_dict)
+
+        if embedding is not None:
+
+            self.cache.put(description.description, embedding, recommendation)
 
-        return Recommendation(**response_dict)
+        return recommendation
@@ -1,26 +1,81 @@
+import copy
 import logging
 import os
 import queue
-from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from logging.handlers import (
+    MemoryHandler,
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+)
+
+import orjson
 
 log_listener: QueueListener | None = None
+log_handlers: list[logging.Handler] = []
+
+
+class JSONFormatter(logging.Formatter):
+    """Format log records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": record.created,
+            "lvl": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+
+        if record.exc_info:
+
+            entry["exc"] = self.formatException(record.exc_info)
+
+        return orjson.dumps(entry).decode()
+
+
+class RecordQueueHandler(QueueHandler):
+    """Queue records with their exception info, for the JSON formatter."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so the record does not have to be
+        # picklable. Only the message is merged, its arguments may change later.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        return record
 
 
 def start_logging() -> None:
     global log_listener
 
-    log_queue = queue.Queue(-1)
-    log_listener = QueueListener(
-        log_queue,
-        RotatingFileHandler(
-            os.environ.get("LOGFILE_PATH", "app.log"),
-            maxBytes=1024 * 1024,
-            backupCount=5,
-        ),
+    logfile_path = os.environ.get("LOGFILE_PATH", "app.log")
+
+    # Set by gunicorn_conf.py, every worker rotates its own file.
+    if os.environ.get("LOGFILE_PER_PROCESS"):
+
+        root, extension = os.path.splitext(logfile_path)
+
+        logfile_path = f"{root}.{os.getpid()}{extension}"
+
+    file_handler = RotatingFileHandler(
+        logfile_path,
+        maxBytes=1024 * 1024,
+        backupCount=5,
+    )
+    file_handler.setFormatter(JSONFormatter())
+
+    # Records are written in batches, errors are written right away.
+    memory_handler = MemoryHandler(
+        capacity=256, flushLevel=logging.ERROR, target=file_handler
     )
+    log_handlers.extend([memory_handler, file_handler])
+
+    log_queue = queue.Queue(-1)
+    log_listener = QueueListener(log_queue, memory_handler)
     log_listener.start()
 
-    logging.basicConfig(handlers=[QueueHandler(log_queue)], level=logging.INFO)
+    logging.basicConfig(handlers=[RecordQueueHandler(log_queue)], level=logging.INFO)
 
 
 def stop_logging() -> None:
@@ -29,3 +84,12 @@ def stop_logging() -> None:
     if log_listener:
 
         log_listener.stop()
+
+        log_listener = None
+
+    # The memory handler goes first, so buffered records reach the file.
+    for handler in log_handlers:
+
+        handler.close()
+
+    log_handlers.clear()
@@ -0,0 +1,137 @@
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Callable, List, Optional
+
+
+class SharedStream:
+    """Consume an asynchronous stream of bytes once and replay it to many readers.
+
+    The source is consumed by a background task as soon as the object is
+    created. Every reader gets all chunks from the beginning, including the ones
+    produced before it started reading, and waits for the rest. Chunks are kept
+    for as long as the object is referenced, so it should be dropped once the
+    source is consumed and only in-flight readers hold it.
+
+    Parameters
+    ----------
+    source : AsyncGenerator[bytes, None]
+        Stream to consume.
+    """
+
+    def __init__(self, source: AsyncGenerator[bytes, None]) -> None:
+        self._chunks: List[bytes] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._source = source
+        self._task = asyncio.create_task(self._consume(source))
+
+    def add_done_callback(self, callback: Callable[[], None]) -> None:
+        """Call a function once the source is consumed, or failed.
+
+        Parameters
+        ----------
+        callback : Callable[[], None]
+            Function to call.
+        """
+        self._task.add_done_callback(lambda _: callback())
+
+    async def cancel(self) -> None:
+        """Stop consuming the source and wait until it is closed.
+
+        Readers that did not get all chunks yet raise an exception.
+        """
+        self._task.cancel()
+
+        await asyncio.gather(self._task, return_exceptions=True)
+
+        # A task cancelled before its first step never ran _consume, so nothing
+        # closed the source or woke up the readers.
+        await self._source.aclose()
+
+        if not self._done:
+
+            self._error = RuntimeError("Stream was cancelled.")
+
+            self._done = True
+
+            self._notify()
+
+    async def wait_started(self) -> None:
+        """Wait until the source produces its first chunk or ends.
+
+        Raises
+        ------
+        BaseException
+            The exception raised by the source before its first chunk, if any.
+        """
+        while not self._chunks and not self._done:
+
+            await self._changed.wait()
+
+        if not self._chunks and self._error is not None:
+
+            raise self._error
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _consume(self, source: AsyncGenerator[bytes, None]) -> None:
+        try:
+
+            async for chunk in source:
+
+                self._chunks.append(chunk)
+
+                self._notify()
+
+        except Exception as exc:
+
+            self._error = exc
+
+        except asyncio.CancelledError:
+
+            self._error = RuntimeError("Stream was cancelled.")
+
+            raise
+
+        finally:
+
+            self._done = True
+
+            self._notify()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """Iterate over all chunks of the stream.
+
+        Yields
+        ------
+        bytes
+            Chunks of the source in the original order.
+
+        Raises
+        ------
+        BaseException
+            The exception raised by the source, if any.
+        """
+        index = 0
+
+        while True:
+
+            changed = self._changed
+
+            while index < len(self._chunks):
+
+                yield self._chunks[index]
+
+                index += 1
+
+            if self._done:
+
+                if self._error is not None:
+
+                    raise self._error
+
+                return
+
+            await changed.wait()